@@ -0,0 +1,59 @@
+import numpy as np
+from numba import njit
+
+# Kernels are compiled against explicit signatures at import, so worker processes forked
+# from an importing process inherit the compiled code instead of loading it again.
+
+
+@njit('int64[:](float32[:, :])', cache=True)
+def nn_tour(distances):
+    """
+    Build a nearest-neighbour tour that starts at the first point and ends at the last one.
+    """
+    n = distances.shape[0]
+    tour = np.empty(n, dtype=np.int64)
+    visited = np.zeros(n, dtype=np.bool_)
+    visited[0] = True
+    visited[n - 1] = True
+    tour[0] = 0
+    tour[n - 1] = n - 1
+
+    current = 0
+    for step in range(1, n - 1):
+        next_location = -1
+        best = np.inf
+        for candidate in range(n):
+            if not visited[candidate] and distances[current, candidate] < best:
+                best = distances[current, candidate]
+                next_location = candidate
+        tour[step] = next_location
+        visited[next_location] = True
+        current = next_location
+
+    return tour
+
+
+@njit('Tuple((int64[:], float64))(float32[:, :], int64[:])', cache=True)
+def two_opt(distances, tour):
+    """
+    Improve a tour with 2-opt moves, keeping its first and last stops fixed.
+    Returns the improved tour and its length.
+    """
+    tour = tour.copy()
+    n = tour.shape[0]
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 2):
+            for j in range(i + 1, n - 1):
+                # Accumulate in float64 so a move and its reversal never both look improving.
+                delta = (np.float64(distances[tour[i - 1], tour[j]]) + np.float64(distances[tour[i], tour[j + 1]])
+                         - np.float64(distances[tour[i - 1], tour[i]]) - np.float64(distances[tour[j], tour[j + 1]]))
+                if delta < -1e-9:
+                    tour[i:j + 1] = tour[i:j + 1][::-1].copy()
+                    improved = True
+
+    length = 0.0
+    for k in range(n - 1):
+        length += distances[tour[k], tour[k + 1]]
+    return tour, length
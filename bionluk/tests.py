@@ -0,0 +1,197 @@
+import os
+import tempfile
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from ._kernels import nn_tour, two_opt
+from .utils import (DATA_COLUMNS, DEPOT_COORDINATES, VALID_PATTERNS, calculate_route_length, haversine_distance,
+                    haversine_matrix,
+                    create_weekly_schedule_with_dynamic_trucks, load_data, optimize_delivery_routes,
+                    routes_to_dataframe, save_routes_to_excel, transform_routes_to_coordinates)
+
+
+class RouteLengthTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.data = pd.DataFrame({
+            'OUTLET_ID': np.arange(1, 61),
+            'LATITUDE': DEPOT_COORDINATES[0] + rng.uniform(-0.1, 0.1, 60),
+            'LONGITUDE': DEPOT_COORDINATES[1] + rng.uniform(-0.1, 0.1, 60),
+            'FREQUENCY': rng.integers(1, 6, 60),
+        })
+
+    def test_truck_lengths_match_transformed_routes(self):
+        optimized_routes, route_lengths = optimize_delivery_routes(self.data, DEPOT_COORDINATES, [3, 3, 3, 3, 3])
+        transformed_routes = transform_routes_to_coordinates(optimized_routes, self.data, DEPOT_COORDINATES)
+
+        for day, day_routes in transformed_routes.items():
+            truck_lengths = list(route_lengths[day].values())
+            self.assertEqual(len(truck_lengths), len(day_routes))
+            for route, truck_length in zip(day_routes, truck_lengths):
+                self.assertAlmostEqual(truck_length, calculate_route_length(route), places=3)
+
+    def test_process_pool_matches_sequential_routing(self):
+        np.random.seed(0)
+        with mock.patch('bionluk.utils.PARALLEL_MIN_STOPS', float('inf')):
+            sequential = optimize_delivery_routes(self.data, DEPOT_COORDINATES, [3, 3, 3, 3, 3])
+        np.random.seed(0)
+        with mock.patch('bionluk.utils.PARALLEL_MIN_STOPS', 0):
+            parallel = optimize_delivery_routes(self.data, DEPOT_COORDINATES, [3, 3, 3, 3, 3])
+
+        self.assertEqual(parallel, sequential)
+
+    def test_calculate_route_length_of_degenerate_routes(self):
+        self.assertEqual(calculate_route_length([]), 0.0)
+        self.assertEqual(calculate_route_length([DEPOT_COORDINATES]), 0.0)
+
+
+class LoadDataTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, 'outlets.xlsx')
+        self.data = pd.DataFrame({
+            'OUTLET_ID': [1, 2, 3],
+            'LONGITUDE': [29.01, 29.02, 29.03],
+            'LATITUDE': [41.01, 41.02, 41.03],
+            'FREQUENCY': [1, 2, 3],
+            'NAME': ['a', 'b', 'c'],
+        })
+        self.data.to_excel(self.file_path, index=False)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_load_data_reads_only_pipeline_columns(self):
+        data = load_data(self.file_path)
+
+        self.assertEqual(sorted(data.columns), sorted(DATA_COLUMNS))
+        pd.testing.assert_frame_equal(data[DATA_COLUMNS], self.data[DATA_COLUMNS])
+        self.assertFalse(os.path.exists(self.file_path + '.parquet'))
+
+    def test_load_data_reuses_parquet_copy(self):
+        data = load_data(self.file_path, cache_parquet=True)
+        self.assertTrue(os.path.exists(self.file_path + '.parquet'))
+
+        with mock.patch('bionluk.utils.pd.read_excel', side_effect=AssertionError('Excel parsed again')):
+            cached = load_data(self.file_path, cache_parquet=True)
+        pd.testing.assert_frame_equal(cached, data)
+
+
+class WeeklyScheduleTests(SimpleTestCase):
+    def test_every_retailer_gets_its_frequency_on_non_adjacent_days(self):
+        data = pd.DataFrame({
+            'OUTLET_ID': np.arange(1, 501),
+            'LATITUDE': np.full(500, DEPOT_COORDINATES[0]),
+            'LONGITUDE': np.full(500, DEPOT_COORDINATES[1]),
+            'FREQUENCY': np.tile(np.arange(1, 6), 100),
+        })
+        num_trucks_per_day = [2, 3, 1, 4, 2]
+        np.random.seed(0)
+        weekly_schedule = create_weekly_schedule_with_dynamic_trucks(data, num_trucks_per_day)
+
+        visit_days = {outlet_id: [] for outlet_id in data['OUTLET_ID']}
+        for day, day_schedule in weekly_schedule.items():
+            self.assertTrue(set(day_schedule) <= set(range(num_trucks_per_day[day])))
+            for retailers in day_schedule.values():
+                for retailer_id in retailers:
+                    visit_days[retailer_id].append(day)
+
+        for outlet_id, frequency in zip(data['OUTLET_ID'], data['FREQUENCY']):
+            self.assertEqual(len(visit_days[outlet_id]), frequency)
+            distinct_days = sorted(set(visit_days[outlet_id]))
+            self.assertTrue(all(later - earlier > 1 for earlier, later in zip(distinct_days, distinct_days[1:])))
+
+    def test_pattern_probabilities_follow_sequential_draws(self):
+        for frequency, (patterns, probabilities) in VALID_PATTERNS.items():
+            self.assertEqual(len(patterns), len(probabilities))
+            self.assertAlmostEqual(probabilities.sum(), 1.0)
+
+        # The first visit leaves 4 days open at either end of the week and 3 in the middle.
+        patterns, probabilities = VALID_PATTERNS[2]
+        same_day = sum(probability for pattern, probability in zip(patterns, probabilities) if len(set(pattern)) == 1)
+        self.assertAlmostEqual(same_day, (2 / 4 + 3 / 3) / 5)
+
+
+class RouteExportTests(SimpleTestCase):
+    def setUp(self):
+        self.transformed_routes = {
+            0: [np.array([[41.0, 29.0], [41.1, 29.1], [41.0, 29.0]]), np.array([[41.0, 29.0], [41.2, 29.2]])],
+            1: [],
+            2: [np.array([[41.0, 29.0], [41.3, 29.3], [41.4, 29.4], [41.0, 29.0]])],
+        }
+
+    def test_routes_to_dataframe_columns(self):
+        df = routes_to_dataframe(self.transformed_routes)
+
+        self.assertEqual(df.columns.tolist(), ['Day', 'Truck ID', 'Step', 'Latitude', 'Longitude'])
+        self.assertEqual(df['Day'].tolist(), [1, 1, 1, 1, 1, 3, 3, 3, 3])
+        self.assertEqual(df['Truck ID'].tolist(), [1, 1, 1, 2, 2, 1, 1, 1, 1])
+        self.assertEqual(df['Step'].tolist(), [1, 2, 3, 1, 2, 1, 2, 3, 4])
+        expected_coords = np.concatenate(self.transformed_routes[0] + self.transformed_routes[2])
+        np.testing.assert_array_equal(df[['Latitude', 'Longitude']].to_numpy(), expected_coords)
+
+    def test_routes_to_dataframe_without_routes(self):
+        df = routes_to_dataframe({day: [] for day in range(5)})
+
+        self.assertTrue(df.empty)
+        self.assertEqual(df.columns.tolist(), ['Day', 'Truck ID', 'Step', 'Latitude', 'Longitude'])
+
+    def test_save_routes_to_excel_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'routes.xlsx')
+            with mock.patch('builtins.print'):
+                save_routes_to_excel(self.transformed_routes, filename)
+            saved = pd.read_excel(filename, sheet_name='Routes')
+
+        pd.testing.assert_frame_equal(saved, routes_to_dataframe(self.transformed_routes))
+
+
+class HaversineMatrixTests(SimpleTestCase):
+    def test_matrix_matches_scalar_haversine(self):
+        rng = np.random.default_rng(1)
+        lats = DEPOT_COORDINATES[0] + rng.uniform(-0.5, 0.5, 40)
+        lons = DEPOT_COORDINATES[1] + rng.uniform(-0.5, 0.5, 40)
+
+        distances = haversine_matrix(lats, lons)
+
+        self.assertEqual(distances.shape, (40, 40))
+        expected = np.array([[haversine_distance((lat1, lon1), (lat2, lon2)) for lat2, lon2 in zip(lats, lons)]
+                             for lat1, lon1 in zip(lats, lons)])
+        np.testing.assert_allclose(distances, expected, rtol=0, atol=1e-9)
+        np.testing.assert_array_equal(np.diag(distances), 0)
+
+
+class TourKernelTests(SimpleTestCase):
+    def route_distances(self, seed, num_stops):
+        rng = np.random.default_rng(seed)
+        lats = np.concatenate([[DEPOT_COORDINATES[0]], DEPOT_COORDINATES[0] + rng.uniform(-0.1, 0.1, num_stops),
+                               [DEPOT_COORDINATES[0]]])
+        lons = np.concatenate([[DEPOT_COORDINATES[1]], DEPOT_COORDINATES[1] + rng.uniform(-0.1, 0.1, num_stops),
+                               [DEPOT_COORDINATES[1]]])
+        return haversine_matrix(lats, lons).astype(np.float32)
+
+    def tour_length(self, distances, tour):
+        return float(distances[tour[:-1], tour[1:]].astype(np.float64).sum())
+
+    def test_tours_keep_endpoints_and_visit_every_stop(self):
+        for seed in range(5):
+            distances = self.route_distances(seed, 30)
+            n = len(distances)
+
+            for tour in (nn_tour(distances), two_opt(distances, nn_tour(distances))[0]):
+                self.assertEqual(tour[0], 0)
+                self.assertEqual(tour[-1], n - 1)
+                self.assertEqual(sorted(tour.tolist()), list(range(n)))
+
+    def test_two_opt_never_lengthens_the_tour(self):
+        for seed in range(5):
+            distances = self.route_distances(seed, 30)
+            initial_tour = nn_tour(distances)
+
+            tour, length = two_opt(distances, initial_tour)
+
+            self.assertAlmostEqual(length, self.tour_length(distances, tour), places=4)
+            self.assertLessEqual(length, self.tour_length(distances, initial_tour) + 1e-6)
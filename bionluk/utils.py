@@ -1,141 +1,276 @@
 import math
-import random
+import os
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
 import folium
 import numpy as np
 import pandas as pd
-from scipy.spatial.distance import cdist
+import xlsxwriter
+
+from ._kernels import nn_tour, two_opt
 
 # Constants
 DEPOT_COORDINATES = (41.08919085025256, 29.04999926199514)
+DATA_COLUMNS = ['OUTLET_ID', 'LATITUDE', 'LONGITUDE', 'FREQUENCY']
+ROUTE_COLORS = ('blue', 'green', 'red', 'purple', 'orange')
+# Below this many scheduled stops per week, forking a process pool costs more than routing the days in turn.
+PARALLEL_MIN_STOPS = 10000
 
-def haversine_distance(coord1, coord2):
+def visit_patterns(frequency):
+    """
+    List the day patterns for a weekly frequency with their probabilities when visits are drawn one at a time
+    from the days still available, each visit ruling out its adjacent days but not the day itself.
+    """
+    probabilities = {(): 1.0}
+    for _ in range(frequency):
+        next_probabilities = defaultdict(float)
+        for days, probability in probabilities.items():
+            blocked_mask = 0
+            for day in days:
+                blocked_mask |= (1 << (day + 1)) | ((1 << day) >> 1)
+            available_days = [day for day in range(5) if not blocked_mask >> day & 1]
+            for day in available_days:
+                next_probabilities[tuple(sorted(days + (day,)))] += probability / len(available_days)
+        probabilities = next_probabilities
+
+    patterns = sorted(probabilities)
+    return patterns, np.array([probabilities[pattern] for pattern in patterns])
+
+VALID_PATTERNS = {frequency: visit_patterns(frequency) for frequency in range(1, 6)}
+
+def haversine_distance(coord1, coord2, _sin=math.sin, _cos=math.cos, _radians=math.radians, _atan2=math.atan2,
+                       _sqrt=math.sqrt):
     """
     Calculate the Haversine distance between two latitude-longitude coordinates.
+    Routes should go through the vectorized calculate_route_length instead.
     """
     R = 6371
     lat1, lon1 = coord1
     lat2, lon2 = coord2
 
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lon2 - lon1)
+    phi1, phi2 = _radians(lat1), _radians(lat2)
+    delta_phi = _radians(lat2 - lat1)
+    delta_lambda = _radians(lon2 - lon1)
+
+    a = _sin(delta_phi / 2)**2 + _cos(phi1) * _cos(phi2) * _sin(delta_lambda / 2)**2
+    c = 2 * _atan2(_sqrt(a), _sqrt(1 - a))
+
+    return R * c
+
+def haversine_vec(lat, lon):
+    """
+    Calculate the Haversine distances between consecutive points given 1D latitude and longitude arrays.
+    """
+    R = 6371
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    delta_phi = np.diff(lat)
+    delta_lambda = np.diff(lon)
+    cos_lat = np.cos(lat)
+
+    a = np.sin(delta_phi / 2)**2 + cos_lat[:-1] * cos_lat[1:] * np.sin(delta_lambda / 2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
 
-    a = math.sin(delta_phi / 2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+def haversine_matrix(lat, lon):
+    """
+    Calculate the pairwise Haversine distance matrix given 1D latitude and longitude arrays.
+    """
+    R = 6371
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    sin_half_lat, cos_half_lat = np.sin(lat / 2), np.cos(lat / 2)
+    sin_half_lon, cos_half_lon = np.sin(lon / 2), np.cos(lon / 2)
+
+    # sin((x - y) / 2) = sin(x / 2) cos(y / 2) - cos(x / 2) sin(y / 2), so all trig stays O(N).
+    sin_half_delta_phi = sin_half_lat[:, None] * cos_half_lat[None, :] - cos_half_lat[:, None] * sin_half_lat[None, :]
+    sin_half_delta_lambda = sin_half_lon[:, None] * cos_half_lon[None, :] - cos_half_lon[:, None] * sin_half_lon[None, :]
+
+    a = sin_half_delta_phi**2 + cos_lat[:, None] * cos_lat[None, :] * sin_half_delta_lambda**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
 
     return R * c
 
 def calculate_route_length(route):
-    return sum(haversine_distance(route[i], route[i + 1]) for i in range(len(route) - 1))
+    if len(route) < 2:
+        return 0.0
+    route = np.asarray(route, dtype=np.float64)
+    return float(haversine_vec(route[:, 0], route[:, 1]).sum())
 
-def load_data(file_path):
-    return pd.read_excel(file_path)
+def load_data(file_path, cache_parquet=False):
+    """
+    Load the outlet data. With cache_parquet, a Parquet copy of the Excel file is kept next to it
+    and reused while it is up to date; only enable it for files that are loaded more than once.
+    """
+    parquet_path = file_path + '.parquet'
+    if cache_parquet and os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(file_path):
+        return pd.read_parquet(parquet_path)
+
+    data = pd.read_excel(file_path, usecols=DATA_COLUMNS, engine='openpyxl')
+    if cache_parquet:
+        data.to_parquet(parquet_path, index=False)
+    return data
 
 def create_weekly_schedule_with_dynamic_trucks(data, num_trucks_per_day):
     weekly_schedule = {day: defaultdict(list) for day in range(5)}
     sorted_retailers = data.sort_values(by='FREQUENCY', ascending=False)
-
-    def add_to_schedule(retailer_id, frequency, day_trucks):
-        available_days = set(range(5))
-        while frequency > 0:
-            if not available_days:
-                raise ValueError("Cannot schedule more visits than available days.")
-            day = random.choice(list(available_days))
-            truck_id = random.randint(0, day_trucks[day] - 1)
+    retailer_ids = sorted_retailers['OUTLET_ID'].tolist()
+    frequencies = sorted_retailers['FREQUENCY'].to_numpy()
+
+    chosen_patterns = [()] * len(retailer_ids)
+    for frequency in np.unique(frequencies):
+        patterns, probabilities = VALID_PATTERNS.get(frequency) or visit_patterns(frequency)
+        idxs = np.flatnonzero(frequencies == frequency)
+        for idx, pattern_idx in zip(idxs, np.random.choice(len(patterns), size=len(idxs), p=probabilities)):
+            chosen_patterns[idx] = patterns[pattern_idx]
+
+    day_visits = {day: [] for day in range(5)}
+    for retailer_id, pattern in zip(retailer_ids, chosen_patterns):
+        for day in pattern:
+            day_visits[day].append(retailer_id)
+
+    for day, visits in day_visits.items():
+        truck_ids = np.random.randint(0, num_trucks_per_day[day], size=len(visits))
+        for retailer_id, truck_id in zip(visits, truck_ids.tolist()):
             weekly_schedule[day][truck_id].append(retailer_id)
-            frequency -= 1
-
-            for adjacent_day in [day - 1, day + 1]:
-                available_days.discard(adjacent_day)
-
-    for _, row in sorted_retailers.iterrows():
-        add_to_schedule(row['OUTLET_ID'], row['FREQUENCY'], num_trucks_per_day)
 
     return weekly_schedule
 
-def optimize_routes_for_a_day(day_schedule, data, depot_coordinates):
+def build_outlet_index(data, depot_coordinates):
+    """
+    Build a coordinate array with the depot as row 0 and a mapping from outlet ID to row.
+    """
+    outlet_ids = [-1] + data['OUTLET_ID'].tolist()
+    coords = np.vstack([np.asarray(depot_coordinates, dtype=np.float64),
+                        data[['LATITUDE', 'LONGITUDE']].to_numpy(dtype=np.float64)])
+    pos = {outlet_id: idx for idx, outlet_id in enumerate(outlet_ids)}
+    return coords, pos
+
+def optimize_routes_for_a_day(day_schedule, distance_matrix, pos):
     optimized_routes = {}
-    coordinates = data.set_index('OUTLET_ID')[['LATITUDE', 'LONGITUDE']]
-    coordinates.loc[-1] = depot_coordinates
+    route_lengths = {}
 
     for truck_id, retailers in day_schedule.items():
         if not retailers:
             continue
+        if len(retailers) == 1:
+            optimized_routes[truck_id] = [-1, retailers[0], -1]
+            route_lengths[truck_id] = 2 * float(distance_matrix[pos[-1], pos[retailers[0]]])
+            continue
         route_points = [-1] + retailers + [-1]
-        route_coords = coordinates.loc[route_points]
-        distances = cdist(route_coords, route_coords, metric='euclidean')
-
-        current_location = 0 
-        unvisited = set(range(1, len(route_points) - 1))
-        optimized_route = [-1]
-        while unvisited:
-            next_location = min(unvisited, key=lambda x: distances[current_location, x])
-            optimized_route.append(route_points[next_location])
-            unvisited.remove(next_location)
-            current_location = next_location
-        optimized_route.append(-1)
-        optimized_routes[truck_id] = optimized_route
-
-    return optimized_routes
+        idxs = np.fromiter((pos[retailer_id] for retailer_id in route_points), dtype=np.int64)
+        distances = distance_matrix[np.ix_(idxs, idxs)]
+
+        tour, route_length = two_opt(distances, nn_tour(distances))
+        optimized_routes[truck_id] = [route_points[i] for i in tour]
+        route_lengths[truck_id] = route_length
+
+    return optimized_routes, route_lengths
+
+_worker_distance_matrix = None
+_worker_pos = None
+
+def _init_day_worker(distance_matrix, pos):
+    # Initializer arguments reach each worker once (shared copy-on-write under fork), not once per day.
+    global _worker_distance_matrix, _worker_pos
+    _worker_distance_matrix = distance_matrix
+    _worker_pos = pos
+
+def _opt_day(day_schedule):
+    return optimize_routes_for_a_day(day_schedule, _worker_distance_matrix, _worker_pos)
 
 def optimize_delivery_routes(data, depot_coordinates, num_trucks_per_day):
     weekly_schedule = create_weekly_schedule_with_dynamic_trucks(data, num_trucks_per_day)
+
+    coords, pos = build_outlet_index(data, depot_coordinates)
+    distance_matrix = haversine_matrix(coords[:, 0], coords[:, 1]).astype(np.float32)
+
+    days = range(5)
+    total_stops = sum(len(retailers) for day in days for retailers in weekly_schedule[day].values())
+    if total_stops < PARALLEL_MIN_STOPS:
+        results = [optimize_routes_for_a_day(weekly_schedule[day], distance_matrix, pos) for day in days]
+    else:
+        # Known limitation: the pool forks from the calling process, which under Django is a request thread.
+        # Only that thread is copied, so a lock another thread holds at fork time stays held in the workers.
+        with ProcessPoolExecutor(max_workers=len(days), initializer=_init_day_worker,
+                                 initargs=(distance_matrix, pos)) as executor:
+            results = list(executor.map(_opt_day, [weekly_schedule[day] for day in days]))
+
     optimized_routes_weekly = {}
-    for day in range(5):
-        day_schedule = weekly_schedule[day]
-        optimized_routes = optimize_routes_for_a_day(day_schedule, data, depot_coordinates)
+    route_lengths_weekly = {}
+    for day, (optimized_routes, route_lengths) in zip(days, results):
         optimized_routes_weekly[day] = optimized_routes
-    return optimized_routes_weekly
+        route_lengths_weekly[day] = route_lengths
+    return optimized_routes_weekly, route_lengths_weekly
 
-def transform_routes_to_coordinates(optimized_routes, data):
+def transform_routes_to_coordinates(optimized_routes, data, depot_coordinates=DEPOT_COORDINATES):
     """
-    Transform the optimized routes into a list of coordinate pairs for each truck's route.
+    Transform the optimized routes into an (L, 2) array of latitude-longitude pairs for each truck's route.
     """
-    coordinates_dict = data.set_index('OUTLET_ID')[['LATITUDE', 'LONGITUDE']].to_dict('index')
+    coords, pos = build_outlet_index(data, depot_coordinates)
     routes_coordinates = {}
 
     for day, trucks_routes in optimized_routes.items():
         day_routes = []
         for truck_id, route in trucks_routes.items():
-            truck_route_coords = [
-                coordinates_dict[retailer_id] if retailer_id != -1 else {'LATITUDE': DEPOT_COORDINATES[0],
-                                                                         'LONGITUDE': DEPOT_COORDINATES[1]} for
-                retailer_id in route]
-            day_routes.append([(coord['LATITUDE'], coord['LONGITUDE']) for coord in truck_route_coords])
+            day_routes.append(coords[np.fromiter((pos.get(retailer_id, 0) for retailer_id in route), dtype=np.int64)])
         routes_coordinates[day] = day_routes
 
     return routes_coordinates
 
-def routes_to_dataframe(transformed_routes):
+def routes_to_columns(transformed_routes):
     """
-    Convert the transformed route data into a pandas DataFrame.
+    Flatten the transformed route data into one array per output column.
     """
-    route_data = []
+    day_ids, truck_ids, flat_routes = [], [], []
     for day, day_routes in transformed_routes.items():
         for truck_id, route in enumerate(day_routes):
-            for step, (lat, lon) in enumerate(route):
-                route_data.append(
-                    {'Day': day + 1, 'Truck ID': truck_id + 1, 'Step': step + 1, 'Latitude': lat, 'Longitude': lon})
+            day_ids.append(day)
+            truck_ids.append(truck_id)
+            flat_routes.append(np.asarray(route, dtype=np.float64).reshape(-1, 2))
+
+    lengths = np.array([len(route) for route in flat_routes], dtype=np.int64)
+    coords = np.concatenate(flat_routes) if flat_routes else np.empty((0, 2))
+    return {
+        'Day': np.repeat(np.array(day_ids, dtype=np.int64), lengths) + 1,
+        'Truck ID': np.repeat(np.array(truck_ids, dtype=np.int64), lengths) + 1,
+        'Step': np.concatenate([np.arange(1, length + 1) for length in lengths] or [np.empty(0, dtype=np.int64)]),
+        'Latitude': coords[:, 0],
+        'Longitude': coords[:, 1],
+    }
 
-    return pd.DataFrame(route_data)
+def routes_to_dataframe(transformed_routes):
+    """
+    Convert the transformed route data into a pandas DataFrame.
+    """
+    return pd.DataFrame(routes_to_columns(transformed_routes))
 
 def save_routes_to_excel(transformed_routes, filename):
-    df = routes_to_dataframe(transformed_routes)
-    df.to_excel(filename, index=False)
+    columns = routes_to_columns(transformed_routes)
+    # Constant-memory mode flushes each row as it is written, so rows must be written in order.
+    with xlsxwriter.Workbook(filename, {'constant_memory': True}) as workbook:
+        worksheet = workbook.add_worksheet('Routes')
+        worksheet.write_row(0, 0, list(columns))
+        for row_idx, row in enumerate(zip(*columns.values()), start=1):
+            worksheet.write_row(row_idx, 0, row)
     print(f"Routes saved to {filename}")
 
-def plot_routes_on_map(day_routes, depot_coordinates, day=None, weekly_length=None):
+def plot_routes_on_map(day_routes, depot_coordinates, day=None, weekly_length=None, truck_lengths=None):
     map_center = depot_coordinates
     folium_map = folium.Map(location=map_center, zoom_start=12)
     total_day_length = 0
+    if truck_lengths is None:
+        truck_lengths = [calculate_route_length(route) for route in day_routes]
 
-    for truck_id, route in enumerate(day_routes):
-        route_length = calculate_route_length(route)
+    routes_group = folium.FeatureGroup(name=f'Day {day + 1}' if day is not None else 'Routes')
+    for truck_id, (route, route_length) in enumerate(zip(day_routes, truck_lengths)):
         total_day_length += route_length
-        line = folium.PolyLine(locations=route, weight=2.5, color=random.choice(['blue', 'green', 'red', 'purple', 'orange']), popup=f'Truck ID: {truck_id + 1}, Length: {route_length:.2f} km')
-        folium_map.add_child(line)
+        line = folium.PolyLine(locations=route, weight=2.5, color=ROUTE_COLORS[truck_id % len(ROUTE_COLORS)], popup=f'Truck ID: {truck_id + 1}, Length: {route_length:.2f} km')
+        routes_group.add_child(line)
+    folium_map.add_child(routes_group)
 
     if day is not None and weekly_length is not None:
         folium.Marker(depot_coordinates, popup=(f'Total Route Length for Day {day + 1}: {total_day_length:.2f} km\nTotal Length for the Week: {weekly_length:.2f} km'), icon=folium.Icon(color='black', icon='info-sign')).add_to(folium_map)
@@ -154,20 +289,19 @@ def plot_routes_on_map(day_routes, depot_coordinates, day=None, weekly_length=No
 
 def main():
     file_path = input('Enter the filename: ')
-    data = load_data(file_path)
+    data = load_data(file_path, cache_parquet=True)
     truck_availability = get_truck_availability()
-    optimized_routes = optimize_delivery_routes(data, DEPOT_COORDINATES, truck_availability)
-    transformed_routes = transform_routes_to_coordinates(optimized_routes, data)
+    optimized_routes, route_lengths = optimize_delivery_routes(data, DEPOT_COORDINATES, truck_availability)
+    transformed_routes = transform_routes_to_coordinates(optimized_routes, data, DEPOT_COORDINATES)
 
     # Ask the user for the specific day
     day = int(input("Enter the day number (1-5): ")) - 1
 
     # Ensure the day number is within the valid range
     if 0 <= day < 5:
-        daily_lengths = [sum(calculate_route_length(route) for route in day_routes) for day_routes in
-                         transformed_routes.values()]
-        weekly_length = sum(daily_lengths)
-        map_with_routes = plot_routes_on_map(transformed_routes[day], DEPOT_COORDINATES, day, weekly_length)
+        weekly_length = sum(sum(lengths.values()) for lengths in route_lengths.values())
+        map_with_routes = plot_routes_on_map(transformed_routes[day], DEPOT_COORDINATES, day, weekly_length,
+                                             list(route_lengths[day].values()))
         print(f"Map for Day {day + 1} saved as optimized_routes_map_day_{day}.html")
     else:
         print("Invalid day number. Please enter a number between 1 and 5.")
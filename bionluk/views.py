@@ -6,14 +6,17 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import HttpResponse, get_object_or_404, redirect, render
 
 from django.shortcuts import render
+from django.core.cache import cache
 from django.core.files.storage import FileSystemStorage
 from django.shortcuts import render
 from django.conf import settings
 from django.core.files.storage import FileSystemStorage
 from django.http import HttpResponse
 from django.views.decorators.http import require_http_methods
+import hashlib
 import os
-from .utils import load_data, optimize_delivery_routes, transform_routes_to_coordinates, calculate_route_length, plot_routes_on_map
+import pickle
+from .utils import DEPOT_COORDINATES, load_data, optimize_delivery_routes, transform_routes_to_coordinates, plot_routes_on_map
 
 
 def index(request):
@@ -31,7 +34,7 @@ def howtouse(request):
 def contact(request):
     return render(request, 'contact.html')
 
-DEPOT_COORDINATES = (0, 0)
+MAP_CACHE_TIMEOUT = 3600
 
 @require_http_methods(["GET", "POST"])
 def optimize(request):
@@ -41,8 +44,6 @@ def optimize(request):
     if request.method == 'POST':
         file = request.FILES['file']
         if file:
-            fs = FileSystemStorage()
-            filename = fs.save(file.name, file)
             trucks_input = request.POST['trucks']
             try:
                 trucks_list = [int(x.strip()) for x in trucks_input.split(',')]
@@ -53,14 +54,29 @@ def optimize(request):
 
             selected_day = int(request.POST['day'])
 
-            data = load_data(os.path.join(settings.MEDIA_ROOT, filename))
-            optimized_routes = optimize_delivery_routes(data, DEPOT_COORDINATES, trucks_list)
-            transformed_routes = transform_routes_to_coordinates(optimized_routes, data)
+            file_hash = hashlib.md5()
+            for chunk in file.chunks():
+                file_hash.update(chunk)
+            cache_key = hashlib.sha256(pickle.dumps((file_hash.hexdigest(), tuple(trucks_list), selected_day))).hexdigest()
 
-            weekly_length = sum([calculate_route_length(route) for routes in transformed_routes.values() for route in routes])
+            # Cache the rendered HTML, not a file per key, so generated_maps keeps one map per day.
+            map_html = cache.get(cache_key)
+            if map_html is None:
+                fs = FileSystemStorage()
+                filename = fs.save(file.name, file)
+                data = load_data(os.path.join(settings.MEDIA_ROOT, filename))
+                optimized_routes, route_lengths = optimize_delivery_routes(data, DEPOT_COORDINATES, trucks_list)
+                transformed_routes = transform_routes_to_coordinates(optimized_routes, data, DEPOT_COORDINATES)
+
+                weekly_length = sum(sum(lengths.values()) for lengths in route_lengths.values())
+
+                map_html = plot_routes_on_map(transformed_routes[selected_day], DEPOT_COORDINATES, selected_day,
+                                              weekly_length, list(route_lengths[selected_day].values())).get_root().render()
+                cache.set(cache_key, map_html, timeout=MAP_CACHE_TIMEOUT)
 
             map_html_filename = f'map_day_{selected_day}.html'
             map_html_file = os.path.join(settings.STATIC_URL, map_html_filename)
-            plot_routes_on_map(transformed_routes[selected_day], DEPOT_COORDINATES, selected_day, weekly_length).save(os.path.join(settings.STATIC_ROOT+"generated_maps", map_html_filename))
+            with open(os.path.join(settings.STATIC_ROOT+"generated_maps", map_html_filename), 'w', encoding='utf-8') as map_file:
+                map_file.write(map_html)
 
     return render(request, 'optimize.html', {'map_html_file': map_html_file, 'selected_day': selected_day})